@@ -8,9 +8,10 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from modules.news_fetcher import NewsFetcher
-from modules.article_writer import ArticleWriter
 from modules.image_scraper import ImageScraper
 from modules.blogger_publisher import BloggerPublisher
+from modules.circuit_breaker import (CircuitBreaker, FailoverArticleWriter, RetryQueue,
+                                     load_settings, publish_with_breaker)
 
 import json
 import time
@@ -28,19 +29,33 @@ def log(message):
 post_counter = 0
 posted_titles = set()  # Track posted article titles to avoid duplicates
 
+# Circuit breakers and retry queue persist across ticks
+breakers = {}
+retry_queue = None
+
 def generate_and_post():
     """Generate one article and post it"""
-    global post_counter, posted_titles
+    global post_counter, posted_titles, retry_queue
     post_counter += 1
     
     config = load_config()
+    settings = load_settings(config)
+    if retry_queue is None:
+        retry_queue = RetryQueue(settings['retry_queue_size'], settings['retry_max_attempts'], log=log)
+    if 'blogger' not in breakers:
+        breakers['blogger'] = CircuitBreaker.from_settings('blogger', settings, log=log)
     
     # Initialize modules
     news_fetcher = NewsFetcher(config)
-    article_writer = ArticleWriter(config)
+    article_writer = FailoverArticleWriter(config, breakers, log=log)
     image_scraper = ImageScraper(config)
     blogger_publisher = BloggerPublisher(config)
     
+    # Retry publishes deferred while Blogger was unavailable
+    if len(retry_queue):
+        log(f"Retrying {len(retry_queue)} deferred post(s)...")
+        retry_queue.drain({'blogger': blogger_publisher}, breakers)
+    
     # Determine language (every 3rd post is Bengali)
     language = 'bengali' if post_counter % 3 == 0 else 'english'
     
@@ -90,7 +105,7 @@ def generate_and_post():
         log("ERROR: Article generation failed")
         return False
     
-    log(f"Article generated ({article['word_count']} words)")
+    log(f"Article generated ({article['word_count']} words, provider: {article.get('provider')})")
     
     # Download image
     log("Downloading image...")
@@ -107,13 +122,18 @@ def generate_and_post():
     # Publish
     log("Publishing to Blogger...")
     try:
-        result = blogger_publisher.publish_article(
+        result = publish_with_breaker(
+            'blogger', blogger_publisher, breakers['blogger'], retry_queue,
             article,
             image_path=image_path,
-            status='publish'
+            status='publish',
+            link=news_data['title']
         )
         
-        if result['success']:
+        if result.get('deferred'):
+            log(f"DEFERRED: {result['error']} ({len(retry_queue)} queued)")
+            return False
+        elif result['success']:
             log(f"SUCCESS! Published: {result['url']}")
             log(f"Post ID: {result['post_id']}")
             return True
@@ -8,10 +8,11 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from modules.news_fetcher import NewsFetcher
-from modules.article_writer import ArticleWriter
 from modules.image_scraper import ImageScraper
 from modules.blogger_publisher import BloggerPublisher
 from modules.facebook_publisher import FacebookPublisher
+from modules.circuit_breaker import (CircuitBreaker, FailoverArticleWriter, RetryQueue,
+                                     load_settings, publish_with_breaker)
 
 import json
 import time
@@ -23,6 +24,8 @@ trending_topics = []
 last_trending_refresh = 0
 topic_index = 0
 posted_titles = set()
+breakers = {}
+retry_queue = None
 
 def load_config():
     with open('config.json', 'r') as f:
@@ -33,13 +36,22 @@ def log(message):
     print(f"[{timestamp}] {message}")
 
 def generate_and_post():
-    global topic_index, posted_titles, trending_topics, last_trending_refresh
+    global topic_index, posted_titles, trending_topics, last_trending_refresh, retry_queue
     config = load_config()
+    settings = load_settings(config)
+    if retry_queue is None:
+        retry_queue = RetryQueue(settings['retry_queue_size'], settings['retry_max_attempts'], log=log)
+    for platform in ('blogger', 'facebook'):
+        if platform not in breakers:
+            breakers[platform] = CircuitBreaker.from_settings(platform, settings, log=log)
     news_fetcher = NewsFetcher(config)
-    article_writer = ArticleWriter(config)
+    article_writer = FailoverArticleWriter(config, breakers, log=log)
     image_scraper = ImageScraper(config)
     blogger_publisher = BloggerPublisher(config)
     facebook_publisher = FacebookPublisher(config)
+    if len(retry_queue):
+        log(f"🔁 Retrying {len(retry_queue)} deferred post(s)...")
+        retry_queue.drain({'blogger': blogger_publisher, 'facebook': facebook_publisher}, breakers)
     # Refresh trending topics every 30 minutes
     now = time.time()
     if not trending_topics or now - last_trending_refresh > 60 * 30:
@@ -84,7 +96,7 @@ def generate_and_post():
     word_count = random.randint(1000, 1500)
     try:
         article = article_writer.write_article(news_data, word_count=word_count, language=language)
-        log(f"📝 Article generated with {word_count} words (target) in {language}")
+        log(f"📝 Article generated with {word_count} words (target) in {language} via {article.get('provider')}")
     except Exception as e:
         log(f"❌ Article generation error: {e}")
         article = None
@@ -98,13 +110,17 @@ def generate_and_post():
         log(f"❌ Image download error: {e}")
     try:
         main_image = images[0] if images else None
-        blogger_result = blogger_publisher.publish_article(
+        blogger_result = publish_with_breaker(
+            'blogger', blogger_publisher, breakers['blogger'], retry_queue,
             article if article else news_data,
             image_path=main_image,
-            status='publish'
+            status='publish',
+            link=news_data['title']
         )
         if blogger_result and blogger_result.get('success'):
             log(f"✅ Blogger: Post ID {blogger_result.get('post_id')} | URL: {blogger_result.get('url')}")
+        elif blogger_result and blogger_result.get('deferred'):
+            log(f"⏸️ Blogger deferred: {blogger_result.get('error')}")
         else:
             log(f"❌ Blogger: {blogger_result}")
     except Exception as e:
@@ -113,13 +129,20 @@ def generate_and_post():
         blog_url = blogger_result.get('url') if blogger_result and blogger_result.get('success') else None
         facebook_result = None
         for img in images:
-            facebook_result = facebook_publisher.publish_article(
+            facebook_result = publish_with_breaker(
+                'facebook', facebook_publisher, breakers['facebook'], retry_queue,
                 article if article else news_data,
                 image_path=img,
-                blog_url=blog_url
+                blog_url=blog_url,
+                link=news_data['title']
             )
             if facebook_result['success']:
                 log(f"✅ Facebook: Post ID {facebook_result['post_id']} (image: {img})")
+            elif facebook_result.get('deferred'):
+                # One queued Facebook post per article. This also happens when the Blogger
+                # post was deferred; drain() fills in blog_url once Blogger publishes it.
+                log(f"⏸️ Facebook deferred: {facebook_result.get('error')} (image: {img})")
+                break
             else:
                 log(f"⚠️ Facebook: {facebook_result.get('error')} (image: {img})")
     except Exception as e:
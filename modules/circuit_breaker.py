@@ -0,0 +1,401 @@
+"""
+Circuit Breaker Module
+Fails fast on unhealthy AI providers and publishers, with LLM failover and a publish retry queue
+"""
+
+import copy
+import os
+import time
+import threading
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# api_keys entry (or upper-cased env var) holding each LLM provider's key
+LLM_PROVIDER_KEYS = {
+    'openai': 'openai_api_key',
+    'anthropic': 'anthropic_api_key',
+}
+
+DEFAULT_SETTINGS = {
+    'window_calls': 10,
+    'min_calls': 3,
+    'failure_rate_threshold': 0.5,
+    'slow_call_seconds': 45,
+    'slow_call_rate_threshold': 0.8,
+    'open_seconds': 120,
+    'half_open_max_calls': 1,
+    'retry_queue_size': 50,
+    'retry_max_attempts': 5,
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because its circuit is open"""
+
+    def __init__(self, name, retry_in):
+        self.name = name
+        self.retry_in = retry_in
+        super().__init__(f"Circuit '{name}' is open (retry in {retry_in:.0f}s)")
+
+
+def load_settings(config):
+    """Merge the optional 'resilience' config section over the defaults"""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update({k: v for k, v in config.get('resilience', {}).items()
+                     if not k.startswith('_')})
+    return settings
+
+
+class CircuitBreaker:
+    """Tracks error rate and latency over the last window_calls calls and trips open when unhealthy
+
+    The window counts calls rather than seconds: the auto-post loops make one
+    call per tick, so a time window would never fill when each call waits out
+    a long timeout.
+    """
+
+    def __init__(self, name, window_calls=10, min_calls=3, failure_rate_threshold=0.5,
+                 slow_call_seconds=45, slow_call_rate_threshold=0.8, open_seconds=120,
+                 half_open_max_calls=1, clock=time.monotonic, log=None):
+        self.name = name
+        self.window_calls = window_calls
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+        self.log = log or (lambda message: None)
+
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._calls = deque(maxlen=window_calls)  # (success, latency)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, name, settings, log=None):
+        """Create a breaker from a load_settings() dict"""
+        return cls(
+            name,
+            window_calls=settings['window_calls'],
+            min_calls=settings['min_calls'],
+            failure_rate_threshold=settings['failure_rate_threshold'],
+            slow_call_seconds=settings['slow_call_seconds'],
+            slow_call_rate_threshold=settings['slow_call_rate_threshold'],
+            open_seconds=settings['open_seconds'],
+            half_open_max_calls=settings['half_open_max_calls'],
+            log=log,
+        )
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+            self.log(f"Circuit '{self.name}' half-open: allowing a probe call")
+        return self._state
+
+    def _trip(self):
+        stats = self._stats()
+        self.log(f"Circuit '{self.name}' open for {self.open_seconds}s "
+                 f"(was {self._state}; failure rate {stats['failure_rate']:.0%}, "
+                 f"avg latency {stats['avg_latency']:.1f}s over {stats['calls']} calls)")
+        self._state = OPEN
+        self._opened_at = self.clock()
+        self._half_open_calls = 0
+
+    def retry_in(self):
+        """Seconds until an open circuit allows a probe call"""
+        with self._lock:
+            if self._current_state() != OPEN:
+                return 0.0
+            return max(0.0, self.open_seconds - (self.clock() - self._opened_at))
+
+    def allow_request(self):
+        """Return True if a call may go through now (reserves a probe slot when half-open)"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            return False
+
+    def record_success(self, latency):
+        with self._lock:
+            slow = latency >= self.slow_call_seconds
+            if self._current_state() == HALF_OPEN:
+                # A slow probe is not proof of recovery
+                if slow:
+                    self._trip()
+                else:
+                    self._state = CLOSED
+                    self._calls.clear()
+                    self.log(f"Circuit '{self.name}' closed: probe succeeded in {latency:.1f}s")
+                return
+            self._calls.append((True, latency))
+            self._evaluate()
+
+    def record_failure(self, latency):
+        with self._lock:
+            if self._current_state() == HALF_OPEN:
+                self._trip()
+                return
+            self._calls.append((False, latency))
+            self._evaluate()
+
+    def _evaluate(self):
+        total = len(self._calls)
+        if total < self.min_calls:
+            return
+        failures = sum(1 for ok, _ in self._calls if not ok)
+        slow = sum(1 for _, latency in self._calls if latency >= self.slow_call_seconds)
+        if failures / total >= self.failure_rate_threshold or slow / total >= self.slow_call_rate_threshold:
+            self._trip()
+
+    def call(self, func, *args, **kwargs):
+        """Run func through the breaker, raising CircuitOpenError if the circuit is open"""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name, self.retry_in())
+        start = self.clock()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure(self.clock() - start)
+            raise
+        self.record_success(self.clock() - start)
+        return result
+
+    def stats(self):
+        """Snapshot of the rolling window for logging"""
+        with self._lock:
+            self._current_state()
+            return self._stats()
+
+    def _stats(self):
+        total = len(self._calls)
+        failures = sum(1 for ok, _ in self._calls if not ok)
+        avg_latency = sum(latency for _, latency in self._calls) / total if total else 0.0
+        return {
+            'name': self.name,
+            'state': self._state,
+            'calls': total,
+            'failure_rate': failures / total if total else 0.0,
+            'avg_latency': avg_latency,
+        }
+
+
+class FailoverArticleWriter:
+    """Routes write_article to the first healthy LLM provider that has an API key configured"""
+
+    def __init__(self, config, breakers, providers=None, writer_factory=None, log=print):
+        if writer_factory is None:
+            from modules.article_writer import ArticleWriter
+            writer_factory = ArticleWriter
+        self.breakers = breakers
+        self.log = log
+        self.writers = []
+        settings = load_settings(config)
+        api_keys = config.get('api_keys', {})
+        for provider in providers or list(LLM_PROVIDER_KEYS):
+            key_name = LLM_PROVIDER_KEYS.get(provider)
+            if not key_name:
+                continue
+            key = api_keys.get(key_name) or os.environ.get(key_name.upper(), '')
+            if not key or key.startswith('your_'):
+                continue
+            self.writers.append((provider, writer_factory(self._provider_config(config, provider, key))))
+
+        if not self.writers:
+            # No recognised key: let ArticleWriter resolve its own backend, as before
+            self.writers.append(('default', writer_factory(config)))
+
+        for provider, _ in self.writers:
+            if provider not in self.breakers:
+                self.breakers[provider] = CircuitBreaker.from_settings(provider, settings, log=log)
+
+    @staticmethod
+    def _provider_config(config, provider, key):
+        """Copy of config whose api_keys hold only this provider's LLM key
+
+        The other providers' entries stay present but empty, so the writer can
+        only reach this provider's API.
+        """
+        provider_config = copy.deepcopy(config)
+        api_keys = provider_config.setdefault('api_keys', {})
+        for other, key_name in LLM_PROVIDER_KEYS.items():
+            api_keys[key_name] = key if other == provider else ''
+        return provider_config
+
+    def write_article(self, news_data, **kwargs):
+        """Write an article, failing over to the next provider on error or open circuit"""
+        errors = []
+        for provider, writer in self.writers:
+            breaker = self.breakers[provider]
+            try:
+                article = breaker.call(_checked_write, writer, news_data, **kwargs)
+            except CircuitOpenError as e:
+                errors.append(str(e))
+                self.log(f"LLM failover: skipping {provider} - {e}")
+                continue
+            except Exception as e:
+                errors.append(f"{provider}: {e}")
+                self.log(f"LLM failover: {provider} failed - {e}")
+                continue
+            article.setdefault('provider', provider)
+            return article
+
+        raise RuntimeError("All LLM providers failed - " + "; ".join(errors))
+
+
+class ArticleFailed(Exception):
+    """Raised when a writer returns no article content, so the breaker counts it"""
+
+
+def _checked_write(writer, news_data, **kwargs):
+    """Call write_article, raising on an empty result so the breaker counts it"""
+    article = writer.write_article(news_data, **kwargs)
+    if not article or not article.get('content'):
+        # ArticleWriter signals failure by returning an empty article
+        raise ArticleFailed("empty article")
+    return article
+
+
+class RetryQueue:
+    """Bounded queue of publishes deferred while a platform's circuit is open"""
+
+    def __init__(self, max_size=50, max_attempts=5, log=print):
+        self.max_size = max_size
+        self.max_attempts = max_attempts
+        self.log = log
+        self._items = deque()
+        self._urls = {}  # link -> URL of posts published from the queue
+
+    def __len__(self):
+        return len(self._items)
+
+    def is_waiting(self, platform, link):
+        """True if another platform's post for the same article is still queued"""
+        return bool(link) and any(item['link'] == link and item['platform'] != platform
+                                  for item in self._items)
+
+    def defer(self, platform, args, kwargs, link=None):
+        """Queue a publish_article call for a platform; returns False if an older post was evicted
+
+        link groups posts for the same article, so a queued Facebook post can
+        pick up the blog_url of the Blogger post published before it.
+        """
+        evicted = None
+        if len(self._items) >= self.max_size:
+            evicted = self._items.popleft()
+            self.log(f"Retry queue: full ({self.max_size}), dropping oldest "
+                     f"{evicted['platform']} post after {evicted['attempts']} attempts")
+        self._items.append({'platform': platform, 'args': args, 'kwargs': kwargs,
+                            'link': link, 'attempts': 0})
+        return evicted is None
+
+    def drain(self, publishers, breakers):
+        """Retry queued publishes whose platform circuit allows a call; returns successes
+
+        Platforms are drained in the order of the publishers dict, so list
+        Blogger before Facebook to carry the blog URL forward.
+        """
+        pending = list(self._items)
+        self._items.clear()
+        published = []
+        for platform in publishers:
+            # Articles whose earlier-platform post is still queued
+            waiting = {item['link'] for item in self._items if item['link']}
+            for item in [item for item in pending if item['platform'] == platform]:
+                result = self._retry(item, publishers[platform], breakers[platform], waiting)
+                if result:
+                    published.append((platform, result))
+        self._items.extend(item for item in pending if item['platform'] not in publishers)
+        return published
+
+    def _retry(self, item, publisher, breaker, waiting):
+        """Retry one queued publish, re-queueing it unless it succeeds or runs out of attempts"""
+        platform = item['platform']
+        link = item['link']
+        if breaker.state == OPEN or link in waiting:
+            self._items.append(item)
+            return None
+        kwargs = item['kwargs']
+        if 'blog_url' in kwargs and not kwargs['blog_url'] and link in self._urls:
+            kwargs = dict(kwargs, blog_url=self._urls[link])
+        try:
+            result = breaker.call(_checked_publish, publisher, *item['args'], **kwargs)
+        except CircuitOpenError:
+            self._items.append(item)
+            return None
+        except PublishFailed as e:
+            result = e.result
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        if result and result.get('success'):
+            if link and result.get('url'):
+                self._urls[link] = result['url']
+                if len(self._urls) > self.max_size:
+                    self._urls.pop(next(iter(self._urls)))
+            self.log(f"Retry queue: {platform} published {result.get('url') or result.get('post_id')}")
+            return result
+        item['attempts'] += 1
+        if item['attempts'] < self.max_attempts:
+            self._items.append(item)
+        else:
+            self.log(f"Retry queue: dropping {platform} post after {item['attempts']} attempts")
+        return None
+
+
+class PublishFailed(Exception):
+    """An unsuccessful publish_article result, carried through the breaker"""
+
+    def __init__(self, result):
+        self.result = result or {'success': False, 'error': 'No result'}
+        super().__init__(self.result.get('error', 'Unknown error'))
+
+
+def _checked_publish(publisher, *args, **kwargs):
+    """Call publish_article, raising on an unsuccessful result so the breaker counts it"""
+    result = publisher.publish_article(*args, **kwargs)
+    if not result or not result.get('success'):
+        # Publishers report API errors in the result dict instead of raising
+        raise PublishFailed(result)
+    return result
+
+
+def publish_with_breaker(platform, publisher, breaker, retry_queue, *args, link=None, **kwargs):
+    """Publish through the platform breaker, deferring to the retry queue while it is not closed
+
+    A post whose article still has a queued post on another platform (e.g.
+    Facebook waiting for its Blogger link) is deferred too, so drain() can
+    publish them in order.
+    """
+    if retry_queue.is_waiting(platform, link):
+        retry_queue.defer(platform, args, kwargs, link=link)
+        return {'success': False, 'deferred': True,
+                'error': "Waiting for this article's queued post on another platform"}
+    try:
+        return breaker.call(_checked_publish, publisher, *args, **kwargs)
+    except CircuitOpenError as e:
+        retry_queue.defer(platform, args, kwargs, link=link)
+        return {'success': False, 'deferred': True, 'error': str(e)}
+    except PublishFailed as e:
+        result = e.result
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+    if breaker.state == CLOSED:
+        return result
+    # This failure tripped (or re-tripped) the circuit: keep the post for a retry
+    retry_queue.defer(platform, args, kwargs, link=link)
+    return dict(result, deferred=True)
@@ -0,0 +1,425 @@
+"""
+Tests for the circuit breaker, LLM failover and publish retry queue
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from modules.circuit_breaker import (CLOSED, OPEN, HALF_OPEN, CircuitBreaker, CircuitOpenError,
+                                     FailoverArticleWriter, RetryQueue, load_settings,
+                                     publish_with_breaker)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def make_breaker(clock, **kwargs):
+    settings = dict(window_calls=10, min_calls=3, failure_rate_threshold=0.5,
+                    slow_call_seconds=10, slow_call_rate_threshold=0.8, open_seconds=60)
+    settings.update(kwargs)
+    return CircuitBreaker('test', clock=clock, **settings)
+
+
+def fail():
+    raise RuntimeError('boom')
+
+
+def slow(clock, seconds):
+    def call():
+        clock.advance(seconds)
+        return 'ok'
+    return call
+
+
+def trip(breaker):
+    for _ in range(breaker.min_calls):
+        with pytest.raises(RuntimeError):
+            breaker.call(fail)
+    assert breaker.state == OPEN
+
+
+class FakePublisher:
+    def __init__(self, success=True):
+        self.success = success
+        self.calls = []
+
+    def publish_article(self, article, **kwargs):
+        self.calls.append((article, kwargs))
+        if self.success:
+            return {'success': True, 'post_id': len(self.calls), 'url': f"https://blog/{len(self.calls)}"}
+        return {'success': False, 'error': 'API error'}
+
+
+def test_trips_on_failure_rate():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    breaker.call(lambda: 'ok')
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+    assert breaker.state == CLOSED  # below min_calls
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 'ok')
+
+
+def test_window_keeps_only_recent_calls():
+    clock = FakeClock()
+    breaker = make_breaker(clock, window_calls=4)
+    for _ in range(10):
+        breaker.call(lambda: 'ok')
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+    assert breaker.state == CLOSED
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+    assert breaker.state == OPEN  # 2 of the last 4 calls failed
+
+
+@pytest.mark.parametrize('call_seconds', [30, 120, 600])
+def test_trips_on_slow_failures_at_loop_cadence(call_seconds):
+    # One call per tick, then the loop sleeps 60 seconds
+    clock = FakeClock()
+    breaker = CircuitBreaker.from_settings('openai', load_settings({}))
+    breaker.clock = clock
+
+    def timeout():
+        clock.advance(call_seconds)
+        raise TimeoutError('timed out')
+
+    tripped_at = None
+    for tick in range(1, 11):
+        try:
+            breaker.call(timeout)
+        except CircuitOpenError:
+            pass
+        except TimeoutError:
+            pass
+        if breaker.state == OPEN and tripped_at is None:
+            tripped_at = tick
+        clock.advance(60)
+    assert tripped_at == 3
+
+
+def test_trips_on_slow_call_rate():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(3):
+        assert breaker.call(slow(clock, 15)) == 'ok'
+    assert breaker.state == OPEN
+
+
+def test_open_becomes_half_open_after_open_seconds():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    trip(breaker)
+    clock.advance(59)
+    assert breaker.state == OPEN
+    assert breaker.retry_in() == pytest.approx(1)
+    clock.advance(1)
+    assert breaker.state == HALF_OPEN
+
+
+def test_half_open_allows_a_single_probe():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    trip(breaker)
+    clock.advance(60)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+def test_half_open_probe_success_closes():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    trip(breaker)
+    clock.advance(60)
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == CLOSED
+    assert breaker.stats()['calls'] == 0
+
+
+def test_half_open_probe_failure_reopens():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    trip(breaker)
+    clock.advance(60)
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+    assert breaker.state == OPEN
+    assert breaker.retry_in() == pytest.approx(60)
+
+
+def test_half_open_slow_probe_reopens():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    trip(breaker)
+    clock.advance(60)
+    assert breaker.call(slow(clock, 15)) == 'ok'
+    assert breaker.state == OPEN
+
+
+def test_publish_that_trips_breaker_is_deferred():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    queue = RetryQueue(log=lambda message: None)
+    publisher = FakePublisher(success=False)
+
+    results = [publish_with_breaker('blogger', publisher, breaker, queue, {'title': n},
+                                    status='publish', link=n)
+               for n in ('a', 'b', 'c', 'd')]
+
+    assert [r.get('deferred', False) for r in results] == [False, False, True, True]
+    assert len(publisher.calls) == 3  # 'd' was rejected without calling the API
+    assert len(queue) == 2
+
+
+def test_raised_publish_error_that_trips_breaker_is_deferred():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    queue = RetryQueue(log=lambda message: None)
+
+    class DownPublisher:
+        def publish_article(self, article, **kwargs):
+            raise ConnectionError('connection refused')
+
+    results = [publish_with_breaker('blogger', DownPublisher(), breaker, queue, {'title': n}, link=n)
+               for n in ('a', 'b', 'c')]
+
+    assert results[0] == {'success': False, 'error': 'connection refused'}
+    assert [r.get('deferred', False) for r in results] == [False, False, True]
+    assert len(queue) == 1
+
+
+def test_drain_counts_attempts_and_drops():
+    clock = FakeClock()
+    breaker = make_breaker(clock, min_calls=100)
+    messages = []
+    queue = RetryQueue(max_attempts=2, log=messages.append)
+    publisher = FakePublisher(success=False)
+    queue.defer('blogger', ({'title': 'a'},), {})
+
+    assert queue.drain({'blogger': publisher}, {'blogger': breaker}) == []
+    assert len(queue) == 1
+    assert queue.drain({'blogger': publisher}, {'blogger': breaker}) == []
+    assert len(queue) == 0
+    assert len(publisher.calls) == 2
+    assert 'after 2 attempts' in messages[-1]
+
+
+def test_drain_requeues_while_circuit_open():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    queue = RetryQueue(max_attempts=1, log=lambda message: None)
+    publisher = FakePublisher()
+    queue.defer('blogger', ({'title': 'a'},), {})
+    trip(breaker)
+
+    assert queue.drain({'blogger': publisher}, {'blogger': breaker}) == []
+    assert len(queue) == 1
+    assert publisher.calls == []
+
+    clock.advance(60)
+    published = queue.drain({'blogger': publisher}, {'blogger': breaker})
+    assert [platform for platform, _ in published] == ['blogger']
+    assert len(queue) == 0
+    assert breaker.state == CLOSED
+
+
+def test_drain_requeues_on_circuit_open_error():
+    clock = FakeClock()
+    breaker = make_breaker(clock, half_open_max_calls=1)
+    queue = RetryQueue(max_attempts=1, log=lambda message: None)
+    publisher = FakePublisher()
+    queue.defer('blogger', ({'title': 'a'},), {})
+    trip(breaker)
+    clock.advance(60)
+    assert breaker.allow_request()  # probe slot already taken
+
+    assert queue.drain({'blogger': publisher}, {'blogger': breaker}) == []
+    assert len(queue) == 1
+    assert publisher.calls == []
+
+
+def test_full_queue_logs_evicted_post():
+    messages = []
+    queue = RetryQueue(max_size=1, log=messages.append)
+    assert queue.defer('blogger', ({'title': 'a'},), {})
+    assert not queue.defer('facebook', ({'title': 'b'},), {})
+    assert len(queue) == 1
+    assert 'dropping oldest blogger post' in messages[-1]
+
+
+def test_drain_carries_blog_url_to_facebook():
+    clock = FakeClock()
+    breakers = {'blogger': make_breaker(clock), 'facebook': make_breaker(clock)}
+    queue = RetryQueue(log=lambda message: None)
+    blogger, facebook = FakePublisher(), FakePublisher()
+    queue.defer('facebook', ({'title': 'a'},), {'image_path': 'a.jpg', 'blog_url': None}, link='a')
+    queue.defer('blogger', ({'title': 'a'},), {'status': 'publish'}, link='a')
+
+    queue.drain({'blogger': blogger, 'facebook': facebook}, breakers)
+
+    assert facebook.calls[0][1]['blog_url'] == 'https://blog/1'
+
+
+def test_facebook_waits_for_queued_blogger_post():
+    clock = FakeClock()
+    breakers = {'blogger': make_breaker(clock), 'facebook': make_breaker(clock)}
+    queue = RetryQueue(log=lambda message: None)
+    blogger, facebook = FakePublisher(), FakePublisher()
+    queue.defer('blogger', ({'title': 'a'},), {}, link='a')
+    queue.defer('facebook', ({'title': 'a'},), {'blog_url': None}, link='a')
+    trip(breakers['blogger'])
+
+    queue.drain({'blogger': blogger, 'facebook': facebook}, breakers)
+    assert facebook.calls == []
+    assert len(queue) == 2
+
+
+class FakeWriter:
+    calls = []
+    failing = set()
+    empty = set()
+
+    def __init__(self, config):
+        keys = [provider for provider, key_name in
+                (('openai', 'openai_api_key'), ('anthropic', 'anthropic_api_key'))
+                if config.get('api_keys', {}).get(key_name)]
+        self.provider = keys[0] if keys else 'default'
+
+    def write_article(self, news_data, **kwargs):
+        FakeWriter.calls.append(self.provider)
+        if self.provider in FakeWriter.failing:
+            raise TimeoutError('timed out')
+        if self.provider in FakeWriter.empty:
+            return None
+        return {'content': 'text', 'word_count': 1}
+
+
+@pytest.fixture
+def writer_config(monkeypatch):
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    monkeypatch.delenv('ANTHROPIC_API_KEY', raising=False)
+    FakeWriter.calls = []
+    FakeWriter.failing = set()
+    FakeWriter.empty = set()
+    return {'api_keys': {'openai_api_key': 'sk-1', 'anthropic_api_key': 'sk-2'},
+            'resilience': {'min_calls': 2, 'open_seconds': 60}}
+
+
+def test_failover_prefers_first_healthy_provider(writer_config):
+    breakers = {}
+    writer = FailoverArticleWriter(writer_config, breakers, writer_factory=FakeWriter)
+    assert writer.write_article({'title': 'x'})['provider'] == 'openai'
+
+    FakeWriter.failing = {'openai'}
+    assert writer.write_article({'title': 'x'})['provider'] == 'anthropic'
+    assert writer.write_article({'title': 'x'})['provider'] == 'anthropic'
+    assert breakers['openai'].state == OPEN
+
+    FakeWriter.calls = []
+    assert writer.write_article({'title': 'x'})['provider'] == 'anthropic'
+    assert FakeWriter.calls == ['anthropic']  # tripped provider is skipped without a call
+
+
+def test_failover_counts_empty_article_as_failure(writer_config):
+    breakers = {}
+    writer = FailoverArticleWriter(writer_config, breakers, writer_factory=FakeWriter)
+    FakeWriter.empty = {'openai'}
+    for _ in range(2):
+        assert writer.write_article({'title': 'x'})['provider'] == 'anthropic'
+    assert breakers['openai'].state == OPEN
+
+
+def test_failover_raises_when_all_providers_fail(writer_config):
+    writer = FailoverArticleWriter(writer_config, {}, writer_factory=FakeWriter)
+    FakeWriter.failing = {'openai', 'anthropic'}
+    with pytest.raises(RuntimeError, match='All LLM providers failed'):
+        writer.write_article({'title': 'x'})
+
+
+def test_failover_skips_placeholder_keys_and_reads_env(writer_config, monkeypatch):
+    writer_config['api_keys'] = {'openai_api_key': 'your_openai_api_key'}
+    monkeypatch.setenv('ANTHROPIC_API_KEY', 'sk-env')
+    writer = FailoverArticleWriter(writer_config, {}, writer_factory=FakeWriter)
+    assert [provider for provider, _ in writer.writers] == ['anthropic']
+
+
+def test_failover_falls_back_to_default_writer(writer_config):
+    writer_config['api_keys'] = {}
+    writer = FailoverArticleWriter(writer_config, {}, writer_factory=FakeWriter)
+    assert [provider for provider, _ in writer.writers] == ['default']
+    assert writer.write_article({'title': 'x'})['provider'] == 'default'
+
+
+def test_facebook_deferred_behind_deferred_blogger_post():
+    clock = FakeClock()
+    breakers = {'blogger': make_breaker(clock), 'facebook': make_breaker(clock)}
+    queue = RetryQueue(log=lambda message: None)
+    blogger, facebook = FakePublisher(), FakePublisher()
+    trip(breakers['blogger'])
+
+    blogger_result = publish_with_breaker('blogger', blogger, breakers['blogger'], queue,
+                                          {'title': 'a'}, status='publish', link='a')
+    facebook_result = publish_with_breaker('facebook', facebook, breakers['facebook'], queue,
+                                           {'title': 'a'}, image_path='a.jpg', blog_url=None, link='a')
+
+    assert blogger_result['deferred'] and facebook_result['deferred']
+    assert facebook.calls == []
+    assert len(queue) == 2
+
+    clock.advance(60)
+    queue.drain({'blogger': blogger, 'facebook': facebook}, breakers)
+    assert len(queue) == 0
+    assert facebook.calls[0][1]['blog_url'] == 'https://blog/1'
+
+
+def test_state_changes_are_logged():
+    clock = FakeClock()
+    messages = []
+    breaker = make_breaker(clock, log=messages.append)
+    trip(breaker)
+    clock.advance(60)
+    breaker.call(lambda: 'ok')
+    assert len(messages) == 3
+    assert "Circuit 'test' open for 60s" in messages[0]
+    assert 'failure rate 100%' in messages[0]
+    assert 'half-open' in messages[1]
+    assert 'closed' in messages[2]
+
+
+def test_failover_logs_failed_and_skipped_providers(writer_config):
+    messages = []
+    writer = FailoverArticleWriter(writer_config, {}, writer_factory=FakeWriter, log=messages.append)
+    FakeWriter.failing = {'openai'}
+    for _ in range(3):
+        writer.write_article({'title': 'x'})
+    assert messages[0] == 'LLM failover: openai failed - timed out'
+    assert "Circuit 'openai' open" in messages[1]  # logged as the failure trips it
+    assert messages[2] == 'LLM failover: openai failed - timed out'
+    assert messages[-1].startswith('LLM failover: skipping openai')
+
+
+def test_failover_gives_each_writer_only_its_key(writer_config, monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'sk-env')
+    writer_config['api_keys'] = {'anthropic_api_key': 'sk-2', 'newsapi_key': 'news'}
+    configs = []
+    FailoverArticleWriter(writer_config, {}, writer_factory=configs.append)
+    assert [c['api_keys'] for c in configs] == [
+        {'openai_api_key': 'sk-env', 'anthropic_api_key': '', 'newsapi_key': 'news'},
+        {'openai_api_key': '', 'anthropic_api_key': 'sk-2', 'newsapi_key': 'news'},
+    ]
+    assert writer_config['api_keys'] == {'anthropic_api_key': 'sk-2', 'newsapi_key': 'news'}